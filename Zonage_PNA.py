@@ -1,11 +1,65 @@
 import streamlit as st
 import pandas as pd
+import io
 import json
-from shapely.geometry import Point, shape
+import shapely
+from shapely.geometry import shape
+from shapely.strtree import STRtree
 import time
 import re
-import geopandas as gpd
-import requests
+from dataclasses import dataclass, replace
+from urllib.parse import quote
+import numpy as np
+from pyproj import CRS, Transformer
+from pyproj.exceptions import CRSError
+
+# Parseur JSON rapide (orjson) si disponible, sinon module json standard
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+# Lecture en flux des gros GeoJSON (ijson) si disponible
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# Transformations WGS84 <-> Lambert 93 créées une seule fois et réutilisées pour chaque point
+_T_WGS84_TO_L93 = Transformer.from_crs(4326, 2154, always_xy=True)
+_T_L93_TO_WGS84 = Transformer.from_crs(2154, 4326, always_xy=True)
+
+# Détection du type de PNA d'après le nom du fichier ou de l'espèce (un groupe par type)
+_TYPE_RE = re.compile(
+    r"(chiropt|chauve)"
+    r"|(odonat|libellule)"
+    r"|(gris?[eè]che.*grise)"
+    r"|(gris?[eè]che.*m[eé]rid)"
+    r"|(gris?[eè]che.*rousse|t[eê]te.?rousse)",
+    re.IGNORECASE
+)
+_GROUP_TO_TYPE = {
+    1: "Chiroptères",
+    2: "Odonates",
+    3: "Pie-grièche grise",
+    4: "Pie-grièche méridionale",
+    5: "Pie-grièche à tête rousse"
+}
+
+# Propriétés importantes à afficher en premier
+_PRIORITY = frozenset({"n_espece", "t_enjeux", "enjeu_détaillé", "type_pna", "richessesp", "n_commune", "c_insee"})
+
+# Propriétés d'une zone, construites une seule fois au chargement du fichier
+@dataclass(slots=True)
+class FeatureProps:
+    n_espece: str = "Non spécifié"
+    t_enjeux: str = "Indéterminé"
+    type_pna: str = "Inconnu"
+    fichier_source: str = ""
+    enjeu: str = ""
+    important: dict | None = None  # Propriétés principales (clés de _PRIORITY)
+    other: dict | None = None  # Propriétés détaillées
 
 # Configuration de la page
 st.set_page_config(page_title="Vérificateur de Zones PNA", page_icon="🦇", layout="wide")
@@ -14,47 +68,60 @@ st.set_page_config(page_title="Vérificateur de Zones PNA", page_icon="🦇", la
 st.title("Vérificateur de Zones PNA (Plans Nationaux d'Actions)")
 st.markdown("Cet outil vous permet de vérifier si une adresse ou des coordonnées se trouvent dans une zone de Plan National d'Actions.")
 
+# Session HTTP partagée entre les réexécutions: la connexion TLS à l'API de géocodage est réutilisée d'une recherche à l'autre
+@st.cache_resource(show_spinner=False)
+def get_http_session():
+    # Import différé: requests n'est chargé qu'à la première recherche d'adresse
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=4, max_retries=Retry(total=2, backoff_factor=0.3)))
+    return session
+
+# Requête brute à l'API adresse.data.gouv.fr, mise en cache 24 h par adresse
+# (aucun affichage ici: les éléments Streamlit restent dans get_coordinates)
+@st.cache_data(ttl=86400, max_entries=1000, show_spinner=False)
+def _geocode_raw(address):
+    # Encoder l'adresse pour l'URL
+    encoded_address = quote(address)
+    
+    # URL de l'API française
+    url = f"https://api-adresse.data.gouv.fr/search/?q={encoded_address}&limit=1"
+    
+    # Faire la requête (une erreur HTTP lève une exception et n'est donc pas mise en cache)
+    response = get_http_session().get(url, timeout=10)
+    response.raise_for_status()
+    
+    return response.json()
+
 # Fonction de géocodage utilisant l'API adresse.data.gouv.fr
 def get_coordinates(address):
     with st.spinner("Recherche des coordonnées..."):
         # Utiliser l'API adresse.data.gouv.fr (spécifique à la France)
         try:
-            # Encoder l'adresse pour l'URL
-            encoded_address = requests.utils.quote(address)
+            data = _geocode_raw(address)
             
-            # URL de l'API française
-            url = f"https://api-adresse.data.gouv.fr/search/?q={encoded_address}&limit=1"
-            
-            # Faire la requête
-            response = requests.get(url, timeout=10)
-            
-            # Traiter la réponse
-            if response.status_code == 200:
-                data = response.json()
+            # Vérifier si des résultats ont été trouvés
+            if data and data.get('features') and len(data['features']) > 0:
+                # Récupérer les coordonnées (attention: l'API renvoie [lon, lat])
+                lon, lat = data['features'][0]['geometry']['coordinates']
                 
-                # Vérifier si des résultats ont été trouvés
-                if data and data.get('features') and len(data['features']) > 0:
-                    # Récupérer les coordonnées (attention: l'API renvoie [lon, lat])
-                    lon, lat = data['features'][0]['geometry']['coordinates']
-                    
-                    # Récupérer également l'adresse complète pour l'afficher
-                    full_address = data['features'][0]['properties'].get('label', address)
-                    score = data['features'][0]['properties'].get('score', 0) * 100
-                    
-                    # Afficher un message de succès
-                    st.success(f"✅ Adresse trouvée: {full_address} (confiance: {score:.1f}%)")
-                    
-                    # Convertir en Lambert 93 pour faciliter les comparaisons avec nos données
-                    point_wgs84 = gpd.GeoDataFrame(geometry=[Point(lon, lat)], crs="EPSG:4326")
-                    point_l93 = point_wgs84.to_crs("EPSG:2154")
-                    x_l93, y_l93 = point_l93.geometry[0].x, point_l93.geometry[0].y
-                    
-                    # Retourner les coordonnées (WGS84 pour l'affichage, Lambert93 pour l'analyse)
-                    return (lat, lon, x_l93, y_l93, full_address)
-                else:
-                    st.warning("❌ Aucun résultat trouvé pour cette adresse")
+                # Récupérer également l'adresse complète pour l'afficher
+                full_address = data['features'][0]['properties'].get('label', address)
+                score = data['features'][0]['properties'].get('score', 0) * 100
+                
+                # Afficher un message de succès
+                st.success(f"✅ Adresse trouvée: {full_address} (confiance: {score:.1f}%)")
+                
+                # Convertir en Lambert 93 pour faciliter les comparaisons avec nos données
+                x_l93, y_l93 = _T_WGS84_TO_L93.transform(lon, lat)
+                
+                # Retourner les coordonnées (WGS84 pour l'affichage, Lambert93 pour l'analyse)
+                return (lat, lon, x_l93, y_l93, full_address)
             else:
-                st.warning(f"⚠️ Erreur lors de la requête: {response.status_code}")
+                st.warning("❌ Aucun résultat trouvé pour cette adresse")
                 
         except Exception as e:
             st.error(f"⚠️ Erreur lors de la requête à l'API adresse.data.gouv.fr: {str(e)}")
@@ -72,52 +139,191 @@ def get_coordinates(address):
             
             if st.button("Utiliser ces coordonnées"):
                 # Convertir en Lambert 93
-                point_wgs84 = gpd.GeoDataFrame(geometry=[Point(manual_lon, manual_lat)], crs="EPSG:4326")
-                point_l93 = point_wgs84.to_crs("EPSG:2154")
-                x_l93, y_l93 = point_l93.geometry[0].x, point_l93.geometry[0].y
+                x_l93, y_l93 = _T_WGS84_TO_L93.transform(manual_lon, manual_lat)
                 
                 return (manual_lat, manual_lon, x_l93, y_l93, f"Coordonnées manuelles: {manual_lat}, {manual_lon}")
                 
     return None
 
-# Fonction pour vérifier si un point est dans une zone PNA
-def is_in_pna(lat, lon, x_l93, y_l93, all_data_sources):
+# Fonction pour déterminer la projection déclarée par un GeoJSON (membre "crs")
+def get_declared_crs(crs):
     try:
-        # Point en WGS84 pour l'affichage
-        point_wgs84 = Point(lon, lat)
-        # Point en Lambert 93 pour l'analyse
-        point_l93 = Point(x_l93, y_l93)
+        return CRS.from_user_input(crs['properties']['name'])
+    except (CRSError, KeyError, TypeError):
+        # Pas de projection exploitable: les fichiers sont supposés en Lambert 93
+        return None
+
+# Fonction pour reprojeter des géométries en Lambert 93
+def reproject_to_l93(geoms, source_crs):
+    transformer = Transformer.from_crs(source_crs, 2154, always_xy=True)
+    
+    def transform_coords(coords):
+        return np.column_stack(transformer.transform(coords[:, 0], coords[:, 1]))
+    
+    return list(shapely.transform(geoms, transform_coords))
+
+# Fonction pour construire l'index spatial d'un GeoJSON (une seule fois au chargement)
+# header["crs"] n'est lu qu'après le parcours des features (il peut être rempli pendant la lecture en flux)
+def build_spatial_index(features, header):
+    geoms = []
+    props = []
+    for feature in features:
+        try:
+            geom = shape(feature['geometry'])
+            p = feature['properties']
+            # Séparer une fois pour toutes les propriétés principales des propriétés détaillées
+            p_important = {k: v for k, v in p.items() if k in _PRIORITY}
+            p_other = {k: v for k, v in p.items() if k not in _PRIORITY}
+        except Exception:
+            continue
+        
+        geoms.append(geom)
+        props.append(FeatureProps(
+            n_espece=p.get("n_espece", "Non spécifié"),
+            t_enjeux=p.get("t_enjeux", "Indéterminé"),
+            important=p_important,
+            other=p_other
+        ))
+    
+    # Reprojeter une seule fois en Lambert 93 si le fichier est dans une autre projection
+    source_crs = get_declared_crs(header["crs"])
+    if geoms and source_crs is not None and source_crs.to_epsg() != 2154:
+        geoms = reproject_to_l93(geoms, source_crs)
+    
+    # Préparer les géométries (index interne GEOS) pour accélérer les tests point-dans-polygone répétés
+    shapely.prepare(geoms)
+    
+    tree = STRtree(geoms)
+    
+    # Emprise globale du fichier (NaN si aucune zone: le fichier est alors toujours ignoré)
+    bounds = tuple(shapely.total_bounds(geoms)) if geoms else (np.nan, np.nan, np.nan, np.nan)
+    
+    return {
+        "tree": tree,
+        "geoms": tree.geometries,  # Géométries construites une seule fois, partagées avec l'index
+        "bounds": bounds,
+        "props": props
+    }
+
+# Fonction de lecture en flux d'un GeoJSON: renvoie les features une à une, en une seule passe sur le fichier
+# Les membres "type", "features" et "crs" sont relevés dans header quelle que soit leur position
+def iter_geojson_features(file_bytes, header):
+    feature_builder = None
+    crs_builder = None
+    
+    for prefix, event, value in ijson.parse(io.BytesIO(file_bytes), use_float=True):
+        if prefix == 'features.item' and feature_builder is None:
+            feature_builder = ijson.ObjectBuilder()
+        
+        if feature_builder is not None:
+            feature_builder.event(event, value)
+            # Fin de la feature: la transmettre puis libérer le dictionnaire
+            if prefix == 'features.item' and event not in ('start_map', 'start_array', 'map_key'):
+                yield feature_builder.value
+                feature_builder = None
+        elif prefix == '':
+            if event == 'map_key':
+                if value in ('type', 'features'):
+                    header[value] = True
+                elif value == 'crs':
+                    crs_builder = ijson.ObjectBuilder()
+        elif crs_builder is not None and (prefix == 'crs' or prefix.startswith('crs.')):
+            crs_builder.event(event, value)
+    
+    if crs_builder is not None:
+        header["crs"] = crs_builder.value
+
+# Fonction de chargement d'un GeoJSON, mise en cache entre les réexécutions de Streamlit
+@st.cache_resource(show_spinner=False)
+def load_source(file_bytes, file_name):
+    if ijson is not None:
+        # Lecture en flux: chaque feature est convertie puis libérée, sans charger tout le fichier en dictionnaires
+        header = {"type": False, "features": False, "crs": None}
+        spatial_index = build_spatial_index(iter_geojson_features(file_bytes, header), header)
+        
+        # Vérifier si c'est un GeoJSON valide (connu une fois le fichier entièrement lu)
+        if not (header["type"] and header["features"]):
+            return None
+        
+        return spatial_index
+    
+    # Lecture complète (ijson absent)
+    data = json_loads(file_bytes)
+    
+    # Vérifier si c'est un GeoJSON valide
+    if 'type' not in data or 'features' not in data:
+        return None
+    
+    return build_spatial_index(data['features'], {"crs": data.get('crs')})
+
+# Fonction pour vérifier en une seule passe les zones PNA de plusieurs points (coordonnées Lambert 93)
+# Renvoie, pour chaque point, la liste des zones qui le contiennent
+def is_in_pna_bulk(xs_l93, ys_l93, all_data_sources):
+    xs_l93 = np.asarray(xs_l93, dtype=float)
+    ys_l93 = np.asarray(ys_l93, dtype=float)
+    points_l93 = shapely.points(xs_l93, ys_l93)
+    
+    results = [[] for _ in range(len(points_l93))]
+    
+    # Vérifier dans chaque fichier chargé
+    for file_name, file_info in all_data_sources.items():
+        tree = file_info["tree"]
+        geoms = file_info["geoms"]
+        data_type = file_info["type"]
+        
+        # Ignorer directement les points situés hors de l'emprise globale du fichier
+        minx, miny, maxx, maxy = file_info["bounds"]
+        in_extent = np.flatnonzero(
+            (minx <= xs_l93) & (xs_l93 <= maxx) & (miny <= ys_l93) & (ys_l93 <= maxy)
+        )
+        if in_extent.size == 0:
+            continue
         
-        results = []
+        # Paires (point, zone) candidates dont l'emprise contient le point, en un seul appel à l'index
+        query_idx, tree_idx = tree.query(points_l93.take(in_extent))
+        query_idx = in_extent.take(query_idx)
         
-        # Vérifier dans chaque fichier chargé
-        for file_name, file_info in all_data_sources.items():
-            data_source = file_info["data"]
-            data_type = file_info["type"]
+        # Test exact vectorisé sur les géométries préparées, directement à partir des coordonnées
+        # (intersects_xy inclut les points situés sur la limite de la zone, contrairement à contains_xy)
+        hit_mask = shapely.intersects_xy(geoms.take(tree_idx), xs_l93.take(query_idx), ys_l93.take(query_idx))
+        query_idx, tree_idx = query_idx[hit_mask], tree_idx[hit_mask]
+        
+        # L'index renvoie les zones dans l'ordre de son parcours: revenir à l'ordre du GeoJSON pour chaque point
+        order = np.lexsort((tree_idx, query_idx))
+        
+        for q, i in zip(query_idx[order], tree_idx[order]):
+            feature_props = file_info["props"][i]
             
-            # Convertir le point en Lambert 93 pour comparaison
-            point_buffer = point_l93.buffer(1)  # 1 mètre en Lambert 93
+            # Copies pour ne pas modifier les propriétés de l'index
+            important_props = dict(feature_props.important)
+            other_props = dict(feature_props.other)
+            enjeu = ""
             
-            # Parcourir les features du GeoJSON
-            for feature in data_source['features']:
-                try:
-                    pna_shape = shape(feature['geometry'])
-                    properties = feature['properties']
-                    
-                    # Vérification directe
-                    if pna_shape.contains(point_l93) or pna_shape.intersects(point_buffer):
-                        # Traitement spécifique pour les chiroptères
-                        if data_type == "Chiroptères":
-                            enjeu = properties.get("t_enjeux", "Indéterminé")
-                            properties["enjeu_détaillé"] = enjeu
-                        
-                        # Ajouter le type de PNA et le nom du fichier
-                        properties["type_pna"] = data_type
-                        properties["fichier_source"] = file_name
-                        
-                        results.append(properties)
-                except Exception as e:
-                    continue
+            # Traitement spécifique pour les chiroptères
+            if data_type == "Chiroptères":
+                enjeu = feature_props.t_enjeux
+                important_props["enjeu_détaillé"] = enjeu
+            
+            # Ajouter le type de PNA et le nom du fichier
+            important_props["type_pna"] = data_type
+            other_props["fichier_source"] = file_name
+            
+            results[q].append(replace(
+                feature_props,
+                type_pna=data_type,
+                fichier_source=file_name,
+                enjeu=enjeu,
+                important=important_props,
+                other=other_props
+            ))
+    
+    return results
+
+# Fonction pour vérifier si un point est dans une zone PNA
+def is_in_pna(lat, lon, x_l93, y_l93, all_data_sources):
+    try:
+        # Vérification en Lambert 93 (cas particulier de la vérification groupée)
+        results = is_in_pna_bulk([x_l93], [y_l93], all_data_sources)[0]
         
         if results:
             return True, results
@@ -126,6 +332,71 @@ def is_in_pna(lat, lon, x_l93, y_l93, all_data_sources):
     except Exception as e:
         st.error(f"Erreur lors de la vérification des zones: {str(e)}")
         return False, None
+
+# Fonction pour réinitialiser les champs
+def reset_fields():
+    st.session_state.reset_pressed = True
+    st.session_state.last_address = ""
+    st.session_state.last_lat = 43.6
+    st.session_state.last_lon = 2.7
+
+# Fonction d'affichage des résultats de la vérification (commune aux modes Adresse et Coordonnées)
+def render_results(lat, lon, x_l93, y_l93, all_data_sources, input_mode):
+    # Formulation adaptée au mode de saisie
+    if input_mode == "Adresse":
+        found_msg, not_found_msg = "Cette adresse est située", "Cette adresse n'est"
+    else:
+        found_msg, not_found_msg = "Ces coordonnées sont situées", "Ces coordonnées ne sont"
+    
+    st.write(f"Coordonnées WGS84: {lat:.6f}, {lon:.6f}")
+    st.write(f"Coordonnées Lambert 93: {x_l93:.2f}, {y_l93:.2f}")
+    
+    # Vérification PNA
+    in_pna, results = is_in_pna(lat, lon, x_l93, y_l93, all_data_sources)
+    
+    # Afficher le résultat textuel
+    if in_pna:
+        st.success(f"✅ {found_msg} dans {len(results)} zone(s) PNA")
+        
+        # Créer un tableau avec tous les résultats (propriétés déjà extraites au chargement)
+        result_data = [
+            {
+                "Zone": i,
+                "Type PNA": zone.type_pna, 
+                "Espèce": zone.n_espece,
+                "Enjeu": zone.enjeu,
+                "Fichier source": zone.fichier_source
+            }
+            for i, zone in enumerate(results, 1)
+        ]
+        
+        # Afficher le tableau récapitulatif (un seul DataFrame pour toutes les zones)
+        st.subheader("Zones PNA détectées:")
+        st.dataframe(pd.DataFrame.from_records(result_data))
+        
+        # Affichage détaillé pour chaque zone (dictionnaires affichés directement, sans DataFrame)
+        for i, zone in enumerate(results, 1):
+            with st.expander(f"Détails de la zone {i} - {zone.n_espece}"):
+                # Utiliser des tabs au lieu d'expanders imbriqués
+                tab1, tab2 = st.tabs(["Propriétés principales", "Propriétés détaillées"])
+                
+                with tab1:
+                    if zone.important:
+                        st.json(zone.important)
+                    else:
+                        st.info("Aucune propriété principale disponible")
+                
+                with tab2:
+                    if zone.other:
+                        st.json(zone.other)
+                    else:
+                        st.info("Aucune propriété détaillée disponible")
+    else:
+        st.warning(f"❌ {not_found_msg} dans aucune zone PNA parmi les fichiers chargés")
+    
+    # Ajouter un bouton pour refaire une recherche
+    st.button("🔄 Faire une nouvelle recherche", on_click=reset_fields)
+
 # Structure à deux colonnes
 col1, col2 = st.columns([1, 3])
 
@@ -158,6 +429,16 @@ with col1:
         help="Formats supportés: GeoJSON, JSON en projection Lambert 93 (EPSG:2154)"
     )
     
+    # Index spatiaux conservés pour toute la session (clé: nom et taille du fichier)
+    if 'sources' not in st.session_state:
+        st.session_state.sources = {}
+    
+    # Oublier les fichiers retirés du chargeur pour libérer la mémoire
+    uploaded_keys = {(f.name, f.size) for f in uploaded_files or []}
+    for source_key in list(st.session_state.sources):
+        if source_key not in uploaded_keys:
+            del st.session_state.sources[source_key]
+    
     if uploaded_files:
         for uploaded_file in uploaded_files:
             try:
@@ -170,52 +451,32 @@ with col1:
                 # Détecter automatiquement le type de PNA si demandé
                 if pna_type == "Détection automatique":
                     # Première tentative : détection par le nom du fichier
-                    if "chiroptere" in file_name.lower() or "chauve" in file_name.lower():
-                        detected_type = "Chiroptères"
-                    elif "odonat" in file_name.lower() or "libellule" in file_name.lower():
-                        detected_type = "Odonates"
-                    elif "griseche" in file_name.lower() and "grise" in file_name.lower():
-                        detected_type = "Pie-grièche grise"
-                    elif "griseche" in file_name.lower() and "merid" in file_name.lower():
-                        detected_type = "Pie-grièche méridionale"
-                    elif "griseche" in file_name.lower() and "rousse" in file_name.lower() or "tete rousse" in file_name.lower():
-                        detected_type = "Pie-grièche à tête rousse"
+                    match = _TYPE_RE.search(file_name)
+                    if match:
+                        detected_type = _GROUP_TO_TYPE[match.lastindex]
                     
                     current_type = detected_type
                 else:
                     current_type = pna_type
                 
                 if file_extension in ['geojson', 'json']:
-                    data = json.load(uploaded_file)
+                    # Lecture et indexation une seule fois par fichier et par session
+                    # (load_source est en plus mis en cache entre les sessions)
+                    source_key = (file_name, uploaded_file.size)
+                    if source_key not in st.session_state.sources:
+                        st.session_state.sources[source_key] = load_source(uploaded_file.getvalue(), file_name)
+                    spatial_index = st.session_state.sources[source_key]
                     
-                    # Vérifier si c'est un GeoJSON valide
-                    if 'type' in data and 'features' in data:
+                    if spatial_index is not None:
                         # Si on est en mode détection automatique et que le type n'a pas été détecté par le nom
                         if pna_type == "Détection automatique" and detected_type == "Type non détecté":
                             # Parcourir quelques features pour analyser le contenu
-                            for feature in data['features'][:10]:  # Limiter à 10 features pour des raisons de performance
-                                if 'properties' in feature:
-                                    props = feature['properties']
-                                    
-                                    # Chercher des indices dans les propriétés
-                                    if 'n_espece' in props:
-                                        espece = str(props['n_espece']).lower()
-                                        if 'chauve' in espece or 'chiroptère' in espece or 'chiroptere' in espece:
-                                            detected_type = "Chiroptères"
-                                            break
-                                        elif 'odonates' in espece or 'libellule' in espece:
-                                            detected_type = "Odonates"
-                                            break
-                                        elif 'grièche' in espece or 'grieche' in espece:
-                                            if 'grise' in espece and not 'tête' in espece and not 'tete' in espece:
-                                                detected_type = "Pie-grièche grise"
-                                                break
-                                            elif 'mérid' in espece or 'merid' in espece:
-                                                detected_type = "Pie-grièche méridionale"
-                                                break
-                                            elif 'tête rousse' in espece or 'tete rousse' in espece:
-                                                detected_type = "Pie-grièche à tête rousse"
-                                                break
+                            for feature_props in spatial_index["props"][:10]:  # Limiter à 10 features pour des raisons de performance
+                                # Chercher des indices dans le nom de l'espèce (même motif que pour les noms de fichiers)
+                                match = _TYPE_RE.search(str(feature_props.n_espece))
+                                if match:
+                                    detected_type = _GROUP_TO_TYPE[match.lastindex]
+                                    break
                             
                             # Mise à jour du type détecté
                             if detected_type != "Type non détecté":
@@ -227,13 +488,16 @@ with col1:
                         
                         # Ajouter au dictionnaire de sources de données
                         all_data_sources[file_name] = {
-                            "data": data,
+                            "tree": spatial_index["tree"],
+                            "geoms": spatial_index["geoms"],
+                            "bounds": spatial_index["bounds"],
+                            "props": spatial_index["props"],
                             "type": current_type
                         }
                         
                         file_types[file_name] = "geojson"
                         
-                        st.success(f"Fichier '{file_name}' chargé avec succès. Type détecté: {current_type}. {len(data['features'])} zones.")
+                        st.success(f"Fichier '{file_name}' chargé avec succès. Type détecté: {current_type}. {len(spatial_index['props'])} zones.")
                     else:
                         st.error(f"Format du fichier '{file_name}' GeoJSON invalide")
             except Exception as e:
@@ -246,7 +510,7 @@ with col1:
             # Créer un DataFrame pour l'affichage
             file_summary = []
             for file_name, file_info in all_data_sources.items():
-                feature_count = len(file_info["data"]["features"])
+                feature_count = len(file_info["props"])
                 file_summary.append({
                     "Fichier": file_name,
                     "Type PNA": file_info["type"],
@@ -277,13 +541,6 @@ with col2:
     if 'last_lon' not in st.session_state:
         st.session_state.last_lon = 2.7
     
-    # Fonction pour réinitialiser les champs
-    def reset_fields():
-        st.session_state.reset_pressed = True
-        st.session_state.last_address = ""
-        st.session_state.last_lat = 43.6
-        st.session_state.last_lon = 2.7
-    
     # Bouton de réinitialisation
     reset_col, spacer = st.columns([1, 3])
     with reset_col:
@@ -328,78 +585,7 @@ with col2:
                         coordinates = get_coordinates(address)
                         if coordinates:
                             lat, lon, x_l93, y_l93, full_address = coordinates
-                            st.write(f"Coordonnées WGS84: {lat:.6f}, {lon:.6f}")
-                            st.write(f"Coordonnées Lambert 93: {x_l93:.2f}, {y_l93:.2f}")
-                            
-                            # Vérification PNA avec les coordonnées Lambert 93
-                            in_pna, results = is_in_pna(lat, lon, x_l93, y_l93, all_data_sources)
-                            
-                            # Afficher le résultat textuel
-                            if in_pna:
-                                st.success(f"✅ Cette adresse est située dans {len(results)} zone(s) PNA")
-                                
-                                # Créer un tableau avec tous les résultats
-                                result_data = []
-                                for i, props in enumerate(results, 1):
-                                    pna_type = props.get("type_pna", "Inconnu")
-                                    file_source = props.get("fichier_source", "")
-                                    espece = props.get("n_espece", "Non spécifié")
-                                    enjeu = ""
-                                    
-                                    if pna_type == "Chiroptères":
-                                        enjeu = props.get("enjeu_détaillé", "Indéterminé")
-                                    
-                                    result_data.append({
-                                        "Zone": i,
-                                        "Type PNA": pna_type, 
-                                        "Espèce": espece,
-                                        "Enjeu": enjeu,
-                                        "Fichier source": file_source
-                                    })
-                                
-                                # Afficher le tableau récapitulatif
-                                st.subheader("Zones PNA détectées:")
-                                st.dataframe(pd.DataFrame(result_data))
-                                
-                                # Affichage détaillé pour chaque zone
-                                for i, props in enumerate(results, 1):
-                                    with st.expander(f"Détails de la zone {i} - {props.get('n_espece', 'Non spécifié')}"):
-                                        # Filtrer et trier les propriétés pour plus de clarté
-                                        important_props = {}
-                                        other_props = {}
-                                        
-                                        # Définir les propriétés importantes à afficher en premier
-                                        priority_keys = ["n_espece", "t_enjeux", "enjeu_détaillé", "type_pna", "richessesp", "n_commune", "c_insee"]
-                                        
-                                        for k, v in props.items():
-                                            if k in priority_keys:
-                                                important_props[k] = v
-                                            else:
-                                                other_props[k] = v
-                                        
-                                        # Utiliser des tabs au lieu d'expanders imbriqués
-                                        tab1, tab2 = st.tabs(["Propriétés principales", "Propriétés détaillées"])
-                                        
-                                        with tab1:
-                                            if important_props:
-                                                df_important = pd.DataFrame(list(important_props.items()), 
-                                                                        columns=["Propriété", "Valeur"])
-                                                st.dataframe(df_important)
-                                            else:
-                                                st.info("Aucune propriété principale disponible")
-                                        
-                                        with tab2:
-                                            if other_props:
-                                                df_other = pd.DataFrame(list(other_props.items()), 
-                                                                    columns=["Propriété", "Valeur"])
-                                                st.dataframe(df_other)
-                                            else:
-                                                st.info("Aucune propriété détaillée disponible")
-                            else:
-                                st.warning(f"❌ Cette adresse n'est dans aucune zone PNA parmi les fichiers chargés")
-                            
-                            # Ajouter un bouton pour refaire une recherche
-                            st.button("🔄 Faire une nouvelle recherche", on_click=reset_fields)
+                            render_results(lat, lon, x_l93, y_l93, all_data_sources, input_mode)
                         else:
                             st.error("Impossible de géocoder cette adresse")
         else:  # Mode Coordonnées
@@ -430,18 +616,13 @@ with col2:
                     y_l93 = st.number_input("Y (Lambert 93)", value=6250000.0, format="%.1f")
                 
                 # Convertir Lambert93 en WGS84 pour l'affichage
-                point_l93 = gpd.GeoDataFrame(geometry=[Point(x_l93, y_l93)], crs="EPSG:2154")
-                point_wgs84 = point_l93.to_crs("EPSG:4326")
-                lat = point_wgs84.geometry[0].y
-                lon = point_wgs84.geometry[0].x
+                lon, lat = _T_L93_TO_WGS84.transform(x_l93, y_l93)
                 
                 # Mise à jour des valeurs affichées
                 st.write(f"Coordonnées équivalentes en WGS84: {lat:.6f}, {lon:.6f}")
             else:
                 # Convertir WGS84 en Lambert93 pour l'analyse
-                point_wgs84 = gpd.GeoDataFrame(geometry=[Point(lon, lat)], crs="EPSG:4326")
-                point_l93 = point_wgs84.to_crs("EPSG:2154")
-                x_l93, y_l93 = point_l93.geometry[0].x, point_l93.geometry[0].y
+                x_l93, y_l93 = _T_WGS84_TO_L93.transform(lon, lat)
             
             # Bouton de vérification pour les coordonnées
             check_coords = st.button("Vérifier les coordonnées")
@@ -458,78 +639,7 @@ with col2:
                     results_placeholder.empty()
                     
                     with results_placeholder.container():
-                        st.write(f"Coordonnées WGS84: {lat:.6f}, {lon:.6f}")
-                        st.write(f"Coordonnées Lambert 93: {x_l93:.2f}, {y_l93:.2f}")
-                        
-                        # Vérification PNA
-                        in_pna, results = is_in_pna(lat, lon, x_l93, y_l93, all_data_sources)
-                        
-                        # Afficher le résultat textuel
-                        if in_pna:
-                            st.success(f"✅ Ces coordonnées sont situées dans {len(results)} zone(s) PNA")
-                            
-                            # Créer un tableau avec tous les résultats
-                            result_data = []
-                            for i, props in enumerate(results, 1):
-                                pna_type = props.get("type_pna", "Inconnu")
-                                file_source = props.get("fichier_source", "")
-                                espece = props.get("n_espece", "Non spécifié")
-                                enjeu = ""
-                                
-                                if pna_type == "Chiroptères":
-                                    enjeu = props.get("enjeu_détaillé", "Indéterminé")
-                                
-                                result_data.append({
-                                    "Zone": i,
-                                    "Type PNA": pna_type, 
-                                    "Espèce": espece,
-                                    "Enjeu": enjeu,
-                                    "Fichier source": file_source
-                                })
-                            
-                            # Afficher le tableau récapitulatif
-                            st.subheader("Zones PNA détectées:")
-                            st.dataframe(pd.DataFrame(result_data))
-                            
-                            # Affichage détaillé pour chaque zone
-                            for i, props in enumerate(results, 1):
-                                with st.expander(f"Détails de la zone {i} - {props.get('n_espece', 'Non spécifié')}"):
-                                    # Filtrer et trier les propriétés pour plus de clarté
-                                    important_props = {}
-                                    other_props = {}
-                                    
-                                    # Définir les propriétés importantes à afficher en premier
-                                    priority_keys = ["n_espece", "t_enjeux", "enjeu_détaillé", "type_pna", "richessesp", "n_commune", "c_insee"]
-                                    
-                                    for k, v in props.items():
-                                        if k in priority_keys:
-                                            important_props[k] = v
-                                        else:
-                                            other_props[k] = v
-                                    
-                                    # Utiliser des tabs au lieu d'expanders imbriqués
-                                    tab1, tab2 = st.tabs(["Propriétés principales", "Propriétés détaillées"])
-                                    
-                                    with tab1:
-                                        if important_props:
-                                            df_important = pd.DataFrame(list(important_props.items()), 
-                                                                    columns=["Propriété", "Valeur"])
-                                            st.dataframe(df_important)
-                                        else:
-                                            st.info("Aucune propriété principale disponible")
-                                    
-                                    with tab2:
-                                        if other_props:
-                                            df_other = pd.DataFrame(list(other_props.items()), 
-                                                                columns=["Propriété", "Valeur"])
-                                            st.dataframe(df_other)
-                                        else:
-                                            st.info("Aucune propriété détaillée disponible")
-                        else:
-                            st.warning(f"❌ Ces coordonnées ne sont dans aucune zone PNA parmi les fichiers chargés")
-                        
-                        # Ajouter un bouton pour refaire une recherche
-                        st.button("🔄 Faire une nouvelle recherche", on_click=reset_fields)
+                        render_results(lat, lon, x_l93, y_l93, all_data_sources, input_mode)
 
 # Pied de page
 st.markdown("---")